@@ -0,0 +1,1015 @@
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2020 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+import copy
+from datetime import datetime
+import json
+import logging
+from types import MappingProxyType
+
+from cachetools import TTLCache
+from elasticsearch import Elasticsearch, exceptions
+
+try:  # requires elasticsearch-py >= 7.8 with the async extra
+    from elasticsearch import AsyncElasticsearch
+except ImportError:
+    AsyncElasticsearch = None
+from elasticsearch.serializer import JSONSerializer
+import orjson
+
+from pygeoapi.process.base import BaseProcessor, ProcessorExecuteError
+
+LOGGER = logging.getLogger(__name__)
+
+#: Process metadata and description
+PROCESS_METADATA = {
+    'version': '0.1.0',
+    'id': 'metrics',
+    'title': 'Data registry metrics process',
+    'description': 'Data registry metrics process, providing file and'
+                   ' observation counts over time, optionally filtered'
+                   ' by dataset, country, station or instrument network',
+    'keywords': ['metrics'],
+    'links': [{
+        'type': 'text/html',
+        'rel': 'canonical',
+        'title': 'information',
+        'href': 'https://example.org/process',
+        'hreflang': 'en-US'
+    }],
+    'inputs': [{
+        'id': 'domain',
+        'title': 'metrics domain (dataset or contributor)',
+        'input': {
+            'literalDataDomain': {
+                'dataType': 'string',
+                'valueDefinition': {
+                    'anyValue': True
+                }
+            }
+        },
+        'minOccurs': 1,
+        'maxOccurs': 1
+    }, {
+        'id': 'timescale',
+        'title': 'time scale of metrics (year or month)',
+        'input': {
+            'literalDataDomain': {
+                'dataType': 'string',
+                'valueDefinition': {
+                    'anyValue': True
+                }
+            }
+        },
+        'minOccurs': 1,
+        'maxOccurs': 1
+    }, {
+        'id': 'dataset',
+        'title': 'dataset filter',
+        'input': {
+            'literalDataDomain': {
+                'dataType': 'string',
+                'valueDefinition': {
+                    'anyValue': True
+                }
+            }
+        },
+        'minOccurs': 0,
+        'maxOccurs': 1
+    }, {
+        'id': 'country',
+        'title': 'country filter',
+        'input': {
+            'literalDataDomain': {
+                'dataType': 'string',
+                'valueDefinition': {
+                    'anyValue': True
+                }
+            }
+        },
+        'minOccurs': 0,
+        'maxOccurs': 1
+    }, {
+        'id': 'station',
+        'title': 'station filter',
+        'input': {
+            'literalDataDomain': {
+                'dataType': 'string',
+                'valueDefinition': {
+                    'anyValue': True
+                }
+            }
+        },
+        'minOccurs': 0,
+        'maxOccurs': 1
+    }, {
+        'id': 'network',
+        'title': 'instrument network filter',
+        'input': {
+            'literalDataDomain': {
+                'dataType': 'string',
+                'valueDefinition': {
+                    'anyValue': True
+                }
+            }
+        },
+        'minOccurs': 0,
+        'maxOccurs': 1
+    }, {
+        'id': 'distinct_agencies',
+        'title': 'include count of distinct contributing agencies',
+        'input': {
+            'literalDataDomain': {
+                'dataType': 'boolean',
+                'valueDefinition': {
+                    'anyValue': True
+                }
+            }
+        },
+        'minOccurs': 0,
+        'maxOccurs': 1
+    }],
+    'outputs': [{
+        'id': 'metrics-response',
+        'title': 'output metrics',
+        'output': {
+            'formats': [{
+                'mimeType': 'application/json'
+            }]
+        }
+    }],
+    'example': {
+        'inputs': [{
+            'id': 'domain',
+            'value': 'dataset',
+            'type': 'text/plain'
+        }, {
+            'id': 'timescale',
+            'value': 'year',
+            'type': 'text/plain'
+        }, {
+            'id': 'country',
+            'value': 'CAN',
+            'type': 'text/plain'
+        }]
+    }
+}
+
+
+#: Read-only mapping of filterable property names to Elasticsearch
+#: index fields; exact term filters must hit keyword subfields
+_PROPERTY_TO_FIELD = MappingProxyType({
+    'dataset': 'properties.content_category.keyword',
+    'country': 'properties.platform_country.keyword',
+    'station': 'properties.platform_id.keyword',
+    'network': 'properties.instrument_name.keyword'
+})
+
+#: Fields the metrics aggregations group on; these should be keyword
+#: mapped with eager_global_ordinals for the global-ordinals fast path
+_GROUP_FIELDS = [
+    'properties.content_category.keyword',
+    'properties.content_level',
+    'properties.data_generation_agency.keyword'
+]
+
+
+def build_date_ranges(timescale, begin, end):
+    """
+    Enumerate explicit yearly or monthly date ranges covering the
+    period from <begin> to <end> inclusive, for use in a `date_range`
+    aggregation. Explicit ranges let Elasticsearch count buckets from
+    the BKD index instead of reading doc values per document as a
+    `date_histogram` does.
+
+    :param timescale: time scale of metrics (year or month)
+    :param begin: `datetime.date` of first timestamp in the index
+    :param end: `datetime.date` of last timestamp in the index
+
+    :returns: `list` of `dict` of range bucket definitions
+    """
+
+    ranges = []
+
+    if timescale == 'year':
+        for year in range(begin.year, end.year + 1):
+            ranges.append({
+                'key': '{:04d}'.format(year),
+                'from': '{:04d}-01-01'.format(year),
+                'to': '{:04d}-01-01'.format(year + 1)
+            })
+    else:
+        year, month = begin.year, begin.month
+        while (year, month) <= (end.year, end.month):
+            if month == 12:
+                next_year, next_month = year + 1, 1
+            else:
+                next_year, next_month = year, month + 1
+            ranges.append({
+                'key': '{:04d}-{:02d}'.format(year, month),
+                'from': '{:04d}-{:02d}-01'.format(year, month),
+                'to': '{:04d}-{:02d}-01'.format(next_year, next_month)
+            })
+            year, month = next_year, next_month
+
+    return ranges
+
+
+def _bool_filter(filters):
+    """
+    Build the exact term clauses for the top-level <bool.filter> list
+    of a metrics query, one per active filter. Filters belong in the
+    query, not the aggregation tree. Should one ever be impossible to
+    push down (e.g. it must not narrow sibling aggregations), add it
+    as a named bucket in a single `filters` (plural) aggregation,
+    which has per-filter fast paths; never wrap the tree in nested
+    single `filter` aggs.
+
+    :param filters: `dict` of 0..n filterable properties to values
+
+    :returns: `list` of `dict` of term queries
+    """
+
+    return [
+        {'term': {_PROPERTY_TO_FIELD[prop]: filters[prop]}}
+        for prop in _PROPERTY_TO_FIELD if filters.get(prop) is not None
+    ]
+
+
+def _agg_skeleton(group_fields):
+    """
+    Build an immutable metrics search body grouping on the given
+    fields. Filters are expressed as exact <term> queries in the
+    top-level query's <bool.filter> list, so Elasticsearch narrows
+    the document set before any aggregation runs; the filter list and
+    the date range buckets are left empty here and patched
+    per-request.
+
+    :param group_fields: `list` of fields to group metrics by
+
+    :returns: `dict` of Elasticsearch search body
+    """
+
+    return {
+        'query': {
+            'bool': {
+                'filter': []
+            }
+        },
+        'aggregations': {
+            'groups': {
+                'multi_terms': {
+                    'terms': [
+                        {'field': field} for field in group_fields
+                    ],
+                    # metrics enumerate every group combination; the
+                    # default of 10 buckets would silently truncate
+                    # (categories/agencies x levels stays well under
+                    # this cap)
+                    'size': 1000
+                },
+                'aggregations': {
+                    'date': {
+                        'date_range': {
+                            'field': 'properties.timestamp_date',
+                            'format': 'yyyy-MM-dd',
+                            'keyed': False,
+                            'ranges': []
+                        },
+                        'aggregations': {
+                            'total_obs': {
+                                'sum': {
+                                    'field':
+                                        'properties.number_of_observations'
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+
+
+#: Precompiled search bodies, deep-copied and patched per-request
+_QUERY_DATASET = _agg_skeleton([
+    'properties.content_category.keyword',
+    'properties.content_level'
+])
+_QUERY_CONTRIBUTOR = _agg_skeleton([
+    'properties.data_generation_agency.keyword',
+    'properties.content_level'
+])
+
+#: Min/max aggregation fetching the index's time extent
+_EXTENT_QUERY = {
+    'aggregations': {
+        'min_date': {
+            'min': {
+                'field': 'properties.timestamp_date',
+                'format': 'yyyy-MM-dd'
+            }
+        },
+        'max_date': {
+            'max': {
+                'field': 'properties.timestamp_date',
+                'format': 'yyyy-MM-dd'
+            }
+        }
+    }
+}
+
+#: Shared Elasticsearch clients keyed by host, so per-request processor
+#: instances reuse connections and skip the ping/info round-trips
+_ES_CLIENTS = {}
+_ES_ASYNC_CLIENTS = {}
+
+#: Cached aggregation responses keyed by host, index and search body;
+#: the registry changes on a cadence of hours to days, so repeat
+#: dashboard queries are served without an Elasticsearch round-trip
+_RESPONSE_CACHE = TTLCache(maxsize=256, ttl=300)
+_CACHE_STATS = {'hits': 0, 'misses': 0}
+
+#: Cached index time extents and derived date range buckets, keyed by
+#: host and index; processors are constructed per request, so these
+#: must outlive the instance for memoized responses to skip every
+#: Elasticsearch round-trip
+_EXTENT_CACHE = TTLCache(maxsize=32, ttl=300)
+_RANGES_CACHE = TTLCache(maxsize=64, ttl=300)
+
+#: Host and index pairs whose mappings have already been health-checked
+_CHECKED_INDEXES = set()
+
+
+class OrjsonSerializer(JSONSerializer):
+    """
+    Elasticsearch JSON serializer backed by orjson, wrapping failures
+    in SerializationError as the base class does
+    """
+
+    def dumps(self, data):
+        if isinstance(data, str):
+            return data
+        try:
+            return orjson.dumps(data, default=self.default).decode('utf-8')
+        except (ValueError, TypeError) as err:
+            raise exceptions.SerializationError(data, err)
+
+    def loads(self, s):
+        try:
+            return orjson.loads(s)
+        except (ValueError, TypeError) as err:
+            raise exceptions.SerializationError(s, err)
+
+
+def _get_client(host):
+    """
+    Return a shared Elasticsearch client for the given host, creating
+    it (and verifying connectivity and server version) only on first
+    use per process
+
+    :param host: Elasticsearch host
+
+    :returns: `elasticsearch.Elasticsearch` client
+    """
+
+    if host in _ES_CLIENTS:
+        return _ES_CLIENTS[host]
+
+    LOGGER.debug('Connecting to Elasticsearch')
+    es = Elasticsearch(host, http_compress=True, timeout=30,
+                       max_retries=2, retry_on_timeout=True, maxsize=10,
+                       serializer=OrjsonSerializer())
+    if not es.ping():
+        msg = 'Cannot connect to Elasticsearch'
+        LOGGER.error(msg)
+        raise ProcessorExecuteError(msg)
+
+    LOGGER.debug('Determining ES version')
+    version = es.info()['version']['number']
+    if tuple(int(x) for x in version.split('.')[:2]) < (7, 12):
+        msg = 'only ES 7.12+ supported (multi_terms aggregation)'
+        LOGGER.error(msg)
+        raise ProcessorExecuteError(msg)
+
+    _ES_CLIENTS[host] = es
+    return es
+
+
+def _get_async_client(host):
+    """
+    Return a shared asynchronous Elasticsearch client for the given
+    host, creating it on first use per process. Connectivity and
+    server version are assumed verified by the synchronous client
+
+    :param host: Elasticsearch host
+
+    :returns: `elasticsearch.AsyncElasticsearch` client
+    """
+
+    if host not in _ES_ASYNC_CLIENTS:
+        _ES_ASYNC_CLIENTS[host] = AsyncElasticsearch(
+            host, http_compress=True, timeout=30, max_retries=2,
+            retry_on_timeout=True, serializer=OrjsonSerializer())
+
+    return _ES_ASYNC_CLIENTS[host]
+
+
+def _resolve_field(properties, field):
+    """
+    Resolve a dotted field name against an index mapping's properties
+
+    :param properties: `dict` of mapping properties
+    :param field: dotted field name
+
+    :returns: `dict` of field definition, or `None` if unmapped
+    """
+
+    definition = None
+    for token in field.split('.'):
+        if not properties or token not in properties:
+            return None
+        definition = properties[token]
+        properties = definition.get('properties', definition.get('fields'))
+
+    return definition
+
+
+def _parse_extent(response):
+    """
+    Parse a time extent query response into a pair of dates. On an
+    empty index the min/max aggregations return null values, which is
+    represented as an empty tuple
+
+    :param response: `dict` of extent query response
+
+    :returns: tuple of begin and end `datetime.date`, empty if the
+              index holds no timestamps
+    """
+
+    aggregations = response.get('aggregations', {})
+
+    if aggregations.get('min_date', {}).get('value') is None:
+        return ()
+
+    begin = datetime.strptime(
+        aggregations['min_date']['value_as_string'], '%Y-%m-%d').date()
+    end = datetime.strptime(
+        aggregations['max_date']['value_as_string'], '%Y-%m-%d').date()
+
+    return (begin, end)
+
+
+def _parse_inputs(data):
+    """
+    Validate process inputs and split them into domain, timescale and
+    filter arguments
+
+    :param data: `dict` of process inputs
+
+    :returns: tuple of domain, timescale and `dict` of filters
+    """
+
+    domain = data.get('domain')
+    timescale = data.get('timescale')
+
+    if domain not in ['dataset', 'contributor']:
+        msg = 'Unknown domain: {}'.format(domain)
+        LOGGER.error(msg)
+        raise ProcessorExecuteError(msg)
+
+    if timescale not in ['year', 'month']:
+        msg = 'Unknown timescale: {}'.format(timescale)
+        LOGGER.error(msg)
+        raise ProcessorExecuteError(msg)
+
+    kwargs = {
+        key: value for key, value in data.items()
+        if key not in ['domain', 'timescale']
+    }
+
+    return domain, timescale, kwargs
+
+
+class MetricsProcessor(BaseProcessor):
+    """
+    Data registry metrics processor
+
+    The filterable and group-by fields (content_category,
+    platform_country, platform_id, instrument_name,
+    data_generation_agency) must be mapped as keyword fields or text
+    with a keyword subfield, ideally with eager_global_ordinals
+    enabled, so terms aggregations and term filters qualify for the
+    global-ordinals fast path; a warning is logged on first use of an
+    index for any field that is not
+    """
+
+    def __init__(self, processor_def):
+        """
+        Initialize object
+
+        :param processor_def: processor definition
+
+        :returns: pygeoapi.process.metrics.MetricsProcessor
+        """
+
+        BaseProcessor.__init__(self, processor_def, PROCESS_METADATA)
+
+        url_tokens = processor_def['elastic_path'].split('/')
+
+        LOGGER.debug('Setting Elasticsearch properties')
+        self.es_host = url_tokens[0]
+        self.index = url_tokens[-1]
+
+        LOGGER.debug('host: {}'.format(self.es_host))
+        LOGGER.debug('index: {}'.format(self.index))
+
+        self.es = _get_client(self.es_host)
+
+        # opt-in: serve metrics without blocking a worker thread on
+        # the Elasticsearch round-trip, where the installed client
+        # supports it (elasticsearch-py >= 7.8 with the async extra)
+        self.es_async = None
+        if processor_def.get('async') and AsyncElasticsearch is not None:
+            self.es_async = _get_async_client(self.es_host)
+
+        if (self.es_host, self.index) not in _CHECKED_INDEXES:
+            self._check_mapping()
+            _CHECKED_INDEXES.add((self.es_host, self.index))
+
+    def _check_mapping(self):
+        """
+        Verify that the filterable and group-by fields are mapped for
+        the fast aggregation paths, logging a warning for any field
+        that is analyzed text without a keyword subfield or any
+        group-by keyword field without eager_global_ordinals
+
+        :returns: `None`
+        """
+
+        LOGGER.debug('Checking index mapping')
+        try:
+            mapping = self.es.indices.get_mapping(index=self.index)
+            properties = mapping[self.index]['mappings']['properties']
+        except (exceptions.ElasticsearchException, KeyError) as err:
+            LOGGER.warning('Could not check mapping of index {}: {}'.format(
+                self.index, err))
+            return
+
+        for field in sorted(set(_PROPERTY_TO_FIELD.values()) |
+                            set(_GROUP_FIELDS)):
+            definition = _resolve_field(properties, field)
+            if definition is None:
+                LOGGER.warning('Field {} is not mapped in index {}'.format(
+                    field, self.index))
+            elif definition.get('type') == 'text':
+                LOGGER.warning('Field {} is analyzed text; term filters'
+                               ' and terms aggregations need a keyword'
+                               ' (sub)field'.format(field))
+            elif (field in _GROUP_FIELDS and
+                    not definition.get('eager_global_ordinals')):
+                LOGGER.warning('Group-by field {} lacks'
+                               ' eager_global_ordinals; first aggregation'
+                               ' after each refresh pays ordinal'
+                               ' construction'.format(field))
+
+    def _time_extent(self):
+        """
+        Fetch the time extent of the index from a min/max aggregation
+        on the timestamp field. The result is cached at module level:
+        processors are constructed per request, so an instance cache
+        would re-pay this round-trip on every call
+
+        :returns: tuple of begin and end `datetime.date`, or `None`
+                  if the index holds no timestamps
+        """
+
+        key = (self.es_host, self.index)
+        try:
+            extent = _EXTENT_CACHE[key]
+        except KeyError:
+            try:
+                LOGGER.debug('Querying Elasticsearch for time extent')
+                response = self.es.search(index=self.index,
+                                          body=_EXTENT_QUERY, size=0,
+                                          filter_path=['aggregations.**'])
+            except exceptions.ConnectionError as err:
+                LOGGER.error(err)
+                raise ProcessorExecuteError(err)
+            except exceptions.RequestError as err:
+                LOGGER.error(err)
+                raise ProcessorExecuteError(err)
+
+            extent = _parse_extent(response)
+            _EXTENT_CACHE[key] = extent
+
+        # an empty index is cached as an empty tuple
+        return extent or None
+
+    def _date_ranges(self, timescale):
+        """
+        Return the cached `date_range` bucket definitions covering the
+        index's time extent at the given timescale; empty if the index
+        holds no timestamps
+
+        :param timescale: time scale of metrics (year or month)
+
+        :returns: `list` of `dict` of range bucket definitions
+        """
+
+        key = (self.es_host, self.index, timescale)
+        try:
+            return _RANGES_CACHE[key]
+        except KeyError:
+            pass
+
+        extent = self._time_extent()
+        if extent is None:
+            ranges = []
+        else:
+            ranges = build_date_ranges(timescale, *extent)
+
+        _RANGES_CACHE[key] = ranges
+        return ranges
+
+    async def _atime_extent(self):
+        """
+        Asynchronous counterpart of _time_extent(), sharing its cache
+
+        :returns: tuple of begin and end `datetime.date`, or `None`
+                  if the index holds no timestamps
+        """
+
+        key = (self.es_host, self.index)
+        try:
+            extent = _EXTENT_CACHE[key]
+        except KeyError:
+            try:
+                LOGGER.debug('Querying Elasticsearch for time extent')
+                response = await self.es_async.search(
+                    index=self.index, body=_EXTENT_QUERY, size=0,
+                    filter_path=['aggregations.**'])
+            except exceptions.ConnectionError as err:
+                LOGGER.error(err)
+                raise ProcessorExecuteError(err)
+            except exceptions.RequestError as err:
+                LOGGER.error(err)
+                raise ProcessorExecuteError(err)
+
+            extent = _parse_extent(response)
+            _EXTENT_CACHE[key] = extent
+
+        return extent or None
+
+    async def _adate_ranges(self, timescale):
+        """
+        Asynchronous counterpart of _date_ranges(), sharing its cache
+
+        :param timescale: time scale of metrics (year or month)
+
+        :returns: `list` of `dict` of range bucket definitions
+        """
+
+        key = (self.es_host, self.index, timescale)
+        try:
+            return _RANGES_CACHE[key]
+        except KeyError:
+            pass
+
+        extent = await self._atime_extent()
+        if extent is None:
+            ranges = []
+        else:
+            ranges = build_date_ranges(timescale, *extent)
+
+        _RANGES_CACHE[key] = ranges
+        return ranges
+
+    def _build_agg_body(self, skeleton, timescale, filters):
+        """
+        Build a metrics search body from a precompiled skeleton,
+        patching in the date ranges and filter clauses for one request
+
+        :param skeleton: `dict` of precompiled search body
+        :param timescale: time scale of metrics (year or month)
+        :param filters: `dict` of 0..n filterable properties to values
+
+        :returns: `dict` of Elasticsearch search body, or `None` if
+                  the index holds nothing to aggregate
+        """
+
+        ranges = self._date_ranges(timescale)
+        if not ranges:
+            return None
+
+        query = copy.deepcopy(skeleton)
+
+        date_agg = query['aggregations']['groups']['aggregations']['date']
+        date_agg['date_range']['ranges'] = ranges
+
+        query['query']['bool']['filter'].extend(_bool_filter(filters))
+
+        # cardinality is by far the costliest aggregation (HLL++
+        # allocates per precision_threshold and runs even on zero-hit
+        # queries), so it is strictly opt-in and sits at the outermost
+        # tier where newer ES versions can dynamically prune it
+        if filters.get('distinct_agencies'):
+            query['aggregations']['distinct_agencies'] = {
+                'cardinality': {
+                    'field': 'properties.data_generation_agency.keyword',
+                    'precision_threshold': 1000
+                }
+            }
+
+        return query
+
+    def _build_dataset_body(self, timescale, **kwargs):
+        """
+        Build the dataset metrics search body for one request
+
+        :param timescale: time scale of metrics (year or month)
+        :param kwargs: `dict` of 0..n filterable properties to values
+
+        :returns: `dict` of Elasticsearch search body
+        """
+
+        return self._build_agg_body(_QUERY_DATASET, timescale, kwargs)
+
+    def _build_contributor_body(self, timescale, **kwargs):
+        """
+        Build the contributor metrics search body for one request
+
+        :param timescale: time scale of metrics (year or month)
+        :param kwargs: `dict` of 0..n filterable properties to values
+
+        :returns: `dict` of Elasticsearch search body
+        """
+
+        return self._build_agg_body(_QUERY_CONTRIBUTOR, timescale, kwargs)
+
+    def _run(self, body):
+        """
+        Run a metrics search body against the index, with hit counting
+        disabled, the shard request cache enabled and the response
+        stripped down to its aggregations. Responses are memoized for
+        five minutes keyed by the search body
+
+        :param body: `dict` of Elasticsearch search body
+
+        :returns: `dict` of aggregation results
+        """
+
+        if body is None:  # empty index
+            return {}
+
+        key = (self.es_host, self.index, json.dumps(body, sort_keys=True))
+        try:
+            response = _RESPONSE_CACHE[key]
+            _CACHE_STATS['hits'] += 1
+            return response
+        except KeyError:
+            _CACHE_STATS['misses'] += 1
+
+        try:
+            LOGGER.debug('Querying Elasticsearch')
+            response = self.es.search(index=self.index, body=body,
+                                      size=0, track_total_hits=False,
+                                      request_cache=True,
+                                      preference='_local',
+                                      filter_path=['aggregations.**'])
+        except exceptions.ConnectionError as err:
+            LOGGER.error(err)
+            raise ProcessorExecuteError(err)
+        except exceptions.RequestError as err:
+            LOGGER.error(err)
+            raise ProcessorExecuteError(err)
+
+        # no copying or unwrapping: with filter_path in play the
+        # response is the aggregation tree (or empty on zero matches)
+        aggregations = response.get('aggregations', {})
+        _RESPONSE_CACHE[key] = aggregations
+        return aggregations
+
+    async def _arun(self, body):
+        """
+        Asynchronous counterpart of _run(), sharing its search options
+        and response cache
+
+        :param body: `dict` of Elasticsearch search body
+
+        :returns: `dict` of aggregation results
+        """
+
+        if body is None:  # empty index
+            return {}
+
+        key = (self.es_host, self.index, json.dumps(body, sort_keys=True))
+        try:
+            response = _RESPONSE_CACHE[key]
+            _CACHE_STATS['hits'] += 1
+            return response
+        except KeyError:
+            _CACHE_STATS['misses'] += 1
+
+        try:
+            LOGGER.debug('Querying Elasticsearch')
+            response = await self.es_async.search(
+                index=self.index, body=body, size=0,
+                track_total_hits=False, request_cache=True,
+                preference='_local', filter_path=['aggregations.**'])
+        except exceptions.ConnectionError as err:
+            LOGGER.error(err)
+            raise ProcessorExecuteError(err)
+        except exceptions.RequestError as err:
+            LOGGER.error(err)
+            raise ProcessorExecuteError(err)
+
+        aggregations = response.get('aggregations', {})
+        _RESPONSE_CACHE[key] = aggregations
+        return aggregations
+
+    async def aexecute(self, data):
+        """
+        execute the metrics process asynchronously, freeing the event
+        loop during the Elasticsearch round-trip. For callers that
+        already run an event loop (e.g. the starlette app); there is
+        deliberately no sync wrapper driving this via asyncio.run,
+        since the shared async client's session binds to the first
+        loop it is used on, which such a wrapper would then close
+
+        :param data: `dict` of process inputs
+
+        :returns: `dict` of metrics response
+        """
+
+        if self.es_async is None:
+            msg = 'async execution not enabled for this processor'
+            LOGGER.error(msg)
+            raise ProcessorExecuteError(msg)
+
+        domain, timescale, kwargs = _parse_inputs(data)
+
+        # warm the extent/ranges caches through the async client, so
+        # the body construction below does no blocking I/O
+        await self._adate_ranges(timescale)
+
+        if domain == 'dataset':
+            body = self._build_dataset_body(timescale, **kwargs)
+        else:
+            body = self._build_contributor_body(timescale, **kwargs)
+
+        return await self._arun(body)
+
+    def invalidate(self):
+        """
+        Drop all cached metrics responses, time extents and date
+        ranges, e.g. after new data has been ingested into the index
+
+        :returns: `None`
+        """
+
+        _RESPONSE_CACHE.clear()
+        _EXTENT_CACHE.clear()
+        _RANGES_CACHE.clear()
+
+    def metrics_dataset(self, timescale, **kwargs):
+        """
+        Returns the count of files and observations in the data registry
+        over time, grouped by dataset and data level. Each bucket in
+        <groups> is keyed by the (dataset, level) pair
+
+        :param timescale: time scale of metrics (year or month)
+        :param kwargs: `dict` of 0..n filterable properties to values
+
+        :returns: `dict` of dataset metrics
+        """
+
+        return self._run(self._build_dataset_body(timescale, **kwargs))
+
+    def metrics_contributor(self, timescale, **kwargs):
+        """
+        Returns the count of files and observations in the data registry
+        over time, grouped by contributing agency and data level. Each
+        bucket in <groups> is keyed by the (agency, level) pair
+
+        :param timescale: time scale of metrics (year or month)
+        :param kwargs: `dict` of 0..n filterable properties to values
+
+        :returns: `dict` of contributor metrics
+        """
+
+        return self._run(self._build_contributor_body(timescale, **kwargs))
+
+    def execute_batch(self, inputs_list):
+        """
+        Execute several metrics queries in a single msearch round-trip,
+        letting Elasticsearch run them concurrently on the shard pool.
+        Each entry of <inputs_list> takes the same form as the <data>
+        passed to execute()
+
+        :param inputs_list: `list` of `dict` of process inputs
+
+        :returns: `list` of `dict` of metrics responses, in input order
+        """
+
+        builders = {
+            'dataset': self._build_dataset_body,
+            'contributor': self._build_contributor_body
+        }
+
+        bodies = []
+        for data in inputs_list:
+            domain, timescale, kwargs = _parse_inputs(data)
+            bodies.append(builders[domain](timescale, **kwargs))
+
+        # spread the options _run() passes as search parameters over
+        # their msearch equivalents: size and track_total_hits are
+        # body-level options, preference and request_cache go in each
+        # header line, and filter_path applies to the call itself
+        msearch_body = []
+        for body in bodies:
+            if body is not None:
+                body['size'] = 0
+                body['track_total_hits'] = False
+                msearch_body.append({
+                    'preference': '_local',
+                    'request_cache': True
+                })
+                msearch_body.append(body)
+
+        if not msearch_body:  # empty index
+            return [{} for _ in bodies]
+
+        try:
+            LOGGER.debug('Querying Elasticsearch via msearch')
+            results = self.es.msearch(
+                body=msearch_body, index=self.index,
+                filter_path=['responses.*.aggregations.**',
+                             'responses.*.error'])
+        except exceptions.ConnectionError as err:
+            LOGGER.error(err)
+            raise ProcessorExecuteError(err)
+        except exceptions.RequestError as err:
+            LOGGER.error(err)
+            raise ProcessorExecuteError(err)
+
+        responses = iter(results.get('responses', []))
+        output = []
+        for body in bodies:
+            if body is None:  # empty index
+                output.append({})
+                continue
+            response = next(responses)
+            if 'error' in response:
+                # msearch reports sub-query failures per item
+                LOGGER.error(response['error'])
+                raise ProcessorExecuteError(str(response['error']))
+            output.append(response.get('aggregations', {}))
+
+        return output
+
+    def execute(self, data):
+        """
+        execute the metrics process
+
+        :param data: `dict` of process inputs
+
+        :returns: `dict` of metrics response
+        """
+
+        domain, timescale, kwargs = _parse_inputs(data)
+
+        if domain == 'dataset':
+            return self.metrics_dataset(timescale, **kwargs)
+        else:
+            return self.metrics_contributor(timescale, **kwargs)
+
+    def __repr__(self):
+        return '<MetricsProcessor> {} ({} cache hits, {} misses)'.format(
+            self.name, _CACHE_STATS['hits'], _CACHE_STATS['misses'])
@@ -0,0 +1,188 @@
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2020 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+from datetime import date
+
+import pytest
+
+from pygeoapi.process import metrics
+from pygeoapi.process.base import ProcessorExecuteError
+
+
+def make_processor():
+    """helper function to build a processor without Elasticsearch"""
+
+    processor = metrics.MetricsProcessor.__new__(metrics.MetricsProcessor)
+    processor.es_host = 'localhost:9200'
+    processor.index = 'test-index'
+    return processor
+
+
+def test_build_date_ranges_year():
+    ranges = metrics.build_date_ranges(
+        'year', date(2018, 5, 3), date(2020, 2, 1))
+
+    assert [r['key'] for r in ranges] == ['2018', '2019', '2020']
+    assert ranges[0]['from'] == '2018-01-01'
+    assert ranges[0]['to'] == '2019-01-01'
+    assert ranges[-1]['to'] == '2021-01-01'
+
+
+def test_build_date_ranges_month():
+    ranges = metrics.build_date_ranges(
+        'month', date(2019, 11, 15), date(2020, 2, 3))
+
+    assert [r['key'] for r in ranges] == \
+        ['2019-11', '2019-12', '2020-01', '2020-02']
+    assert ranges[1]['from'] == '2019-12-01'
+    assert ranges[1]['to'] == '2020-01-01'
+
+    ranges = metrics.build_date_ranges(
+        'month', date(2020, 6, 1), date(2020, 6, 30))
+    assert len(ranges) == 1
+    assert ranges[0]['key'] == '2020-06'
+
+
+def test_parse_extent():
+    response = {
+        'aggregations': {
+            'min_date': {'value': 0, 'value_as_string': '1990-01-01'},
+            'max_date': {'value': 0, 'value_as_string': '2020-06-15'}
+        }
+    }
+    assert metrics._parse_extent(response) == \
+        (date(1990, 1, 1), date(2020, 6, 15))
+
+    response = {
+        'aggregations': {
+            'min_date': {'value': None},
+            'max_date': {'value': None}
+        }
+    }
+    assert metrics._parse_extent(response) == ()
+
+    assert metrics._parse_extent({}) == ()
+
+
+def test_parse_inputs():
+    domain, timescale, kwargs = metrics._parse_inputs({
+        'domain': 'dataset',
+        'timescale': 'year',
+        'country': 'CAN'
+    })
+    assert domain == 'dataset'
+    assert timescale == 'year'
+    assert kwargs == {'country': 'CAN'}
+
+    with pytest.raises(ProcessorExecuteError):
+        metrics._parse_inputs({'domain': 'foo', 'timescale': 'year'})
+
+    with pytest.raises(ProcessorExecuteError):
+        metrics._parse_inputs({'domain': 'dataset', 'timescale': 'day'})
+
+
+def test_bool_filter():
+    clauses = metrics._bool_filter({
+        'country': 'CAN',
+        'station': None,
+        'distinct_agencies': True
+    })
+    assert clauses == [
+        {'term': {'properties.platform_country.keyword': 'CAN'}}
+    ]
+
+    assert metrics._bool_filter({}) == []
+
+
+def test_resolve_field():
+    properties = {
+        'properties': {
+            'properties': {
+                'content_category': {
+                    'type': 'text',
+                    'fields': {
+                        'keyword': {'type': 'keyword'}
+                    }
+                },
+                'content_level': {'type': 'float'}
+            }
+        }
+    }
+
+    definition = metrics._resolve_field(
+        properties, 'properties.content_category.keyword')
+    assert definition == {'type': 'keyword'}
+
+    definition = metrics._resolve_field(
+        properties, 'properties.content_level')
+    assert definition == {'type': 'float'}
+
+    assert metrics._resolve_field(properties, 'properties.missing') is None
+    assert metrics._resolve_field(
+        properties, 'properties.content_category.raw') is None
+
+
+def test_build_agg_body_leaves_skeleton_untouched():
+    processor = make_processor()
+    ranges = metrics.build_date_ranges(
+        'year', date(2018, 1, 1), date(2019, 12, 31))
+    metrics._RANGES_CACHE[('localhost:9200', 'test-index', 'year')] = ranges
+
+    try:
+        body = processor._build_agg_body(
+            metrics._QUERY_DATASET, 'year',
+            {'country': 'CAN', 'distinct_agencies': True})
+
+        assert body['query']['bool']['filter'] == [
+            {'term': {'properties.platform_country.keyword': 'CAN'}}
+        ]
+        date_agg = body['aggregations']['groups']['aggregations']['date']
+        assert date_agg['date_range']['ranges'] == ranges
+        assert 'distinct_agencies' in body['aggregations']
+
+        # the shared skeleton must not accumulate per-request state
+        skeleton = metrics._QUERY_DATASET
+        assert skeleton['query']['bool']['filter'] == []
+        date_agg = skeleton['aggregations']['groups']['aggregations']['date']
+        assert date_agg['date_range']['ranges'] == []
+        assert 'distinct_agencies' not in skeleton['aggregations']
+    finally:
+        metrics._RANGES_CACHE.clear()
+
+
+def test_build_agg_body_empty_index():
+    processor = make_processor()
+    metrics._RANGES_CACHE[('localhost:9200', 'test-index', 'month')] = []
+
+    try:
+        body = processor._build_agg_body(
+            metrics._QUERY_DATASET, 'month', {})
+        assert body is None
+    finally:
+        metrics._RANGES_CACHE.clear()